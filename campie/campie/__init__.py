@@ -12,13 +12,14 @@ from .cam import (
     tcam_match,
     tcam_reduce_sum,
 )
-from .util import flip_indices
+from .util import flip_indices, free_pinned_memory
 
 __all__ = [
     "acam_count_mismatches",
     "acam_match",
     "acam_reduce_sum",
     "flip_indices",
+    "free_pinned_memory",
     "tcam_hamming_distance",
     "tcam_match",
     "tcam_reduce_sum",
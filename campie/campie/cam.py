@@ -107,6 +107,8 @@ def tcam_reduce_sum(
     - `values` (`numpy.ndarray` or `cupy.ndarray`): The values to reduce.
       The dimensions of `values` must be the same as the dimensions of `cam`,
       except for the omission of the `columns` dimension.
+      Contiguous `cupy.ndarray` values are used in place, so passing them as such
+      avoids uploading the same values to the GPU on every call.
 
     ### Returns:
     `cupy.ndarray`: The reduction result matrix.
@@ -226,6 +228,8 @@ def acam_reduce_sum(
     - `values` (`numpy.ndarray` or `cupy.ndarray`): The values to reduce.
       The dimensions of `values` must be the same as the dimensions of `cam`,
       except for the omission of the `columns` dimension.
+      Contiguous `cupy.ndarray` values are used in place, so passing them as such
+      avoids uploading the same values to the GPU on every call.
     - `noise` (`float` [optional]): Standard deviation for a normal distribution
       `N(0, noise)` that is randomly sampled from and added to the ACAM thresholds
       to simulate analog inaccuracies before performing the operation. Noise is only
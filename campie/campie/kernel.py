@@ -1,12 +1,21 @@
 """Code generation for CUDA kernels that handle CAM operations."""
 
+from functools import lru_cache
 from string import Template
 from typing import Dict, Tuple
 
 import cupy as cp
 from numpy.typing import DTypeLike
 
-from .types import CamOp, CamVariant, Kernel, dtype_to_ctype, is_float_type
+from .types import (
+    CTYPE_TO_VECTOR_CTYPE,
+    VECTOR_WIDTH,
+    CamOp,
+    CamVariant,
+    Kernel,
+    dtype_to_ctype,
+    is_float_type,
+)
 
 # Kernel notes:
 #
@@ -14,7 +23,8 @@ from .types import CamOp, CamVariant, Kernel, dtype_to_ctype, is_float_type
 #     The indexing inside of a two-dimensional pair of an input matrix and a CAM
 #     is done linearly via `threadIdx.x` and `blockIdx.x`.
 #     The indexing within the (flattened) stack of input and CAM pairs is done
-#     via `blockIdx.y`.
+#     via `blockIdx.y`. Since the block size is tuned independently of the amount of
+#     threads per pair, the last block of each pair may contain unused threads.
 #
 # Operation per thread:
 #     Each thread reduces an input/CAM column down to a single match.
@@ -24,6 +34,16 @@ from .types import CamOp, CamVariant, Kernel, dtype_to_ctype, is_float_type
 #     including dimensions larger than two. To use this kernel with uneven dimensions,
 #     it needs to be wrapped in additional code that flattens the uneven arguments
 #     down to even ones and then reshapes the result back into the demanded shape.
+#
+# Loads:
+#     The scalar kernel loads a single column of inputs and CAM per loop iteration.
+#     The vectorized kernel loads `VECTOR_WIDTH` columns at once via CUDA vector types
+#     (e.g. `float4`), which cuts down the amount of memory transactions. This requires
+#     the amount of columns to be divisible by `VECTOR_WIDTH` and the arrays to be
+#     aligned to the size of their vector type.
+#     For single-byte types, the vectorized kernel goes one step further and packs
+#     four cells into a single word, which are then matched at once via SIMD
+#     intrinsics (e.g. `__vcmpne4`).
 
 KERNEL_OUTLINE = Template(
     r"""
@@ -33,22 +53,24 @@ void cam(
     long columns, long input_rows, long cam_rows
     $extra_params
 ) {
-    long block_id = blockIdx.x + blockIdx.y * gridDim.x;
-    long thread_id = block_id * (blockDim.x * blockDim.y) + threadIdx.x;
+    /* the index of the thread within its core, i.e., a single inputs/CAM pair */
+    long core_thread_id = blockIdx.x * (long) blockDim.x + threadIdx.x;
 
-    /* `gridDim.y` encodes the amount of cores in the stack.
+    /* the last block of each core is padded up to the block size.
         Return here in case the thread is not needed. */
-    if (thread_id >= input_rows * cam_rows * gridDim.y) {
+    if (core_thread_id >= input_rows * cam_rows) {
         return;
     }
 
-    /* these are absolute indices, i.e., within the entire stack of inputs */
-    long cam_row_index = blockIdx.y * cam_rows + thread_id % cam_rows;
-    long input_row_index = thread_id / cam_rows;
+    /* these are absolute indices, i.e., within the entire stack of inputs.
+        `blockIdx.y` encodes the index of the core in the stack. */
+    long thread_id = blockIdx.y * input_rows * cam_rows + core_thread_id;
+    long cam_row_index = blockIdx.y * cam_rows + core_thread_id % cam_rows;
+    long input_row_index = blockIdx.y * input_rows + core_thread_id / cam_rows;
 
     $pre_loop
 
-    for (long i = 0; i < columns; i++) {
+    for (long i = 0; i < columns; i += $columns_per_iteration) {
         $loop_contents
     }
 
@@ -57,11 +79,136 @@ void cam(
 """
 )
 
-TCAM_INT_MATCHING = Template(
+TCAM_SCALAR_LOADS = Template(
     r"""
         $cam_type cam_value = cam[cam_row_index * columns + i];
         $inputs_type input_value = inputs[input_row_index * columns + i];
+"""
+)
+
+ACAM_SCALAR_LOADS = Template(
+    r"""
+        $cam_type min_threshold = cam[2 * (cam_row_index * columns + i)];
+        $cam_type max_threshold = cam[2 * (cam_row_index * columns + i) + 1];
+        $inputs_type input_value = inputs[input_row_index * columns + i];
+"""
+)
+
+TCAM_VECTOR_LOADS = Template(
+    r"""
+        $inputs_vector_type input_vector =
+            reinterpret_cast<const $inputs_vector_type *>(
+                inputs + input_row_index * columns
+            )[i / 4];
+        $cam_vector_type cam_vector = reinterpret_cast<const $cam_vector_type *>(
+            cam + cam_row_index * columns
+        )[i / 4];
+
+        $inputs_type input_values[4] = {
+            input_vector.x, input_vector.y, input_vector.z, input_vector.w
+        };
+        $cam_type cam_values[4] = {
+            cam_vector.x, cam_vector.y, cam_vector.z, cam_vector.w
+        };
+"""
+)
+
+ACAM_VECTOR_LOADS = Template(
+    r"""
+        $inputs_vector_type input_vector =
+            reinterpret_cast<const $inputs_vector_type *>(
+                inputs + input_row_index * columns
+            )[i / 4];
+        /* every vector holds the thresholds of two cells */
+        const $cam_vector_type *cam_vectors =
+            reinterpret_cast<const $cam_vector_type *>(
+                cam + 2 * cam_row_index * columns
+            ) + i / 2;
+        $cam_vector_type cam_vector_0 = cam_vectors[0];
+        $cam_vector_type cam_vector_1 = cam_vectors[1];
 
+        $inputs_type input_values[4] = {
+            input_vector.x, input_vector.y, input_vector.z, input_vector.w
+        };
+        $cam_type cam_values[8] = {
+            cam_vector_0.x, cam_vector_0.y, cam_vector_0.z, cam_vector_0.w,
+            cam_vector_1.x, cam_vector_1.y, cam_vector_1.z, cam_vector_1.w
+        };
+"""
+)
+
+TCAM_LANE_LOADS = Template(
+    r"""
+            $cam_type cam_value = cam_values[lane];
+            $inputs_type input_value = input_values[lane];
+"""
+)
+
+ACAM_LANE_LOADS = Template(
+    r"""
+            $cam_type min_threshold = cam_values[2 * lane];
+            $cam_type max_threshold = cam_values[2 * lane + 1];
+            $inputs_type input_value = input_values[lane];
+"""
+)
+
+VECTORIZED_MATCHING = Template(
+    r"""
+$vector_loads
+        #pragma unroll
+        for (int lane = 0; lane < 4; lane++) {
+$lane_loads
+$comparison
+        }
+
+        $after_lanes
+"""
+)
+
+TCAM_PACKED_MATCHING = Template(
+    r"""
+        /* four single-byte cells are packed into one word and compared at once */
+        unsigned int input_word = reinterpret_cast<const unsigned int *>(
+            inputs + input_row_index * columns
+        )[i / 4];
+        unsigned int cam_word = reinterpret_cast<const unsigned int *>(
+            cam + cam_row_index * columns
+        )[i / 4];
+
+        /* 0xff for every byte that differs and is not a "don't care" (>1 or <0) */
+        unsigned int mismatches =
+            __vcmpleu4(cam_word, 0x01010101) & __vcmpne4(input_word, cam_word);
+
+        $on_packed_mismatch
+"""
+)
+
+ACAM_PACKED_MATCHING = Template(
+    r"""
+        /* four single-byte cells are packed into one word and compared at once */
+        unsigned int input_word = reinterpret_cast<const unsigned int *>(
+            inputs + input_row_index * columns
+        )[i / 4];
+        const unsigned int *cam_words = reinterpret_cast<const unsigned int *>(
+            cam + 2 * cam_row_index * columns
+        ) + i / 2;
+
+        /* the thresholds are interleaved within the row, so they need to be split up */
+        unsigned int min_thresholds = __byte_perm(cam_words[0], cam_words[1], 0x6420);
+        unsigned int max_thresholds = __byte_perm(cam_words[0], cam_words[1], 0x7531);
+
+        /* < 0 = don't care */
+        unsigned int mismatches = ~(
+            (__vcmplts4(min_thresholds, 0) | __vcmples4(min_thresholds, input_word)) &
+            (__vcmplts4(max_thresholds, 0) | __vcmplts4(input_word, max_thresholds))
+        );
+
+        $on_packed_mismatch
+"""
+)
+
+TCAM_INT_COMPARISON = Template(
+    r"""
         if (cam_value > 1 || cam_value < 0) {
             continue;
         }
@@ -72,23 +219,16 @@ TCAM_INT_MATCHING = Template(
 """
 )
 
-TCAM_FLOAT_MATCHING = Template(
+TCAM_FLOAT_COMPARISON = Template(
     r"""
-        $cam_type cam_value = cam[cam_row_index * columns + i];
-        $inputs_type input_value = inputs[input_row_index * columns + i];
-
         if (fabs(input_value - cam_value) > 0.00001) {
             $on_mismatch
         }
 """
 )
 
-ACAM_FLOAT_MATCHING = Template(
+ACAM_FLOAT_COMPARISON = Template(
     r"""
-        $cam_type min_threshold = cam[2 * (cam_row_index * columns + i)];
-        $cam_type max_threshold = cam[2 * (cam_row_index * columns + i) + 1];
-        $inputs_type input_value = inputs[input_row_index * columns + i];
-
         /* nan = don't care */
         if (!(
             (isnan(min_threshold) || min_threshold <= input_value) &&
@@ -99,12 +239,8 @@ ACAM_FLOAT_MATCHING = Template(
 """
 )
 
-ACAM_INT_MATCHING = Template(
+ACAM_INT_COMPARISON = Template(
     r"""
-        $cam_type min_threshold = cam[2 * (cam_row_index * columns + i)];
-        $cam_type max_threshold = cam[2 * (cam_row_index * columns + i) + 1];
-        $inputs_type input_value = inputs[input_row_index * columns + i];
-
         /* < 0 = don't care */
         if (!(
             (min_threshold < 0 || min_threshold <= input_value) &&
@@ -116,6 +252,7 @@ ACAM_INT_MATCHING = Template(
 )
 
 
+@lru_cache(maxsize=128)
 def generate_kernel(
     variant: CamVariant,
     op: CamOp,
@@ -123,56 +260,108 @@ def generate_kernel(
     cam_dtype: DTypeLike,
     results_dtype: DTypeLike,
 ) -> Kernel:
-    """Generates CUDA kernel code and returns a callable CAM kernel."""
+    """
+    Generates CUDA kernel code and returns a callable CAM kernel.
+    Kernels are cached per set of arguments, such that repeated calls reuse both the
+    compiled kernel and its cached attributes.
+
+    If the data types support it, the returned kernel carries a vectorized variant of
+    itself in `Kernel.vectorized`, which for single-byte integers matches four packed
+    cells at once.
+    """
 
     inputs_type = dtype_to_ctype(inputs_dtype)
     cam_type = dtype_to_ctype(cam_dtype)
     results_type = dtype_to_ctype(results_dtype)
 
-    MATCHING_KINDS: Dict[Tuple[CamVariant, bool], Template] = {
-        (CamVariant.TCAM, True): TCAM_FLOAT_MATCHING,
-        (CamVariant.TCAM, False): TCAM_INT_MATCHING,
-        (CamVariant.ACAM, True): ACAM_FLOAT_MATCHING,
-        (CamVariant.ACAM, False): ACAM_INT_MATCHING,
+    COMPARISON_KINDS: Dict[Tuple[CamVariant, bool], Template] = {
+        (CamVariant.TCAM, True): TCAM_FLOAT_COMPARISON,
+        (CamVariant.TCAM, False): TCAM_INT_COMPARISON,
+        (CamVariant.ACAM, True): ACAM_FLOAT_COMPARISON,
+        (CamVariant.ACAM, False): ACAM_INT_COMPARISON,
     }
 
-    matching = MATCHING_KINDS[(variant, is_float_type(cam_dtype))]
+    LOAD_KINDS: Dict[CamVariant, Tuple[Template, Template, Template]] = {
+        CamVariant.TCAM: (TCAM_SCALAR_LOADS, TCAM_VECTOR_LOADS, TCAM_LANE_LOADS),
+        CamVariant.ACAM: (ACAM_SCALAR_LOADS, ACAM_VECTOR_LOADS, ACAM_LANE_LOADS),
+    }
+
+    PACKED_MATCHING_KINDS: Dict[CamVariant, Template] = {
+        CamVariant.TCAM: TCAM_PACKED_MATCHING,
+        CamVariant.ACAM: ACAM_PACKED_MATCHING,
+    }
+
+    comparison = COMPARISON_KINDS[(variant, is_float_type(cam_dtype))]
+    scalar_loads, vector_loads, lane_loads = LOAD_KINDS[variant]
+
+    # both inputs and CAM need to be single-byte integers for packed matching
+    is_packed = inputs_type == "char" and cam_type == "char"
 
     if op == CamOp.MATCH:
         extra_params = f", {results_type} *matches"
         pre_loop = f"{results_type} match = 1;"
         post_loop = "matches[thread_id] = match;"
         on_mismatch = "match = 0; break;"
+        # `break` only leaves the loop over the lanes of a vector
+        after_lanes = "if (match == 0) { break; }"
+        on_packed_mismatch = "if (mismatches != 0) { match = 0; break; }"
 
     elif op == CamOp.COUNT_MISMATCHES:
         extra_params = f", {results_type} *counts"
         pre_loop = f"{results_type} count = 0;"
         post_loop = "counts[thread_id] = count;"
         on_mismatch = "count++;"
+        after_lanes = ""
+        # every mismatching cell sets all eight bits of its byte
+        on_packed_mismatch = "count += __popc(mismatches) / 8;"
 
     elif op == CamOp.REDUCE_SUM:
         extra_params = f", {results_type} *results, {results_type} *values"
         pre_loop = ""
         post_loop = "atomicAdd(&results[input_row_index], values[cam_row_index]);"
         on_mismatch = "return;"
+        after_lanes = ""
+        on_packed_mismatch = "if (mismatches != 0) { return; }"
 
     else:
         raise TypeError(f"unknown CAM operation: {op}")
 
-    loop_contents = matching.safe_substitute(
-        inputs_type=inputs_type,
-        cam_type=cam_type,
-        on_mismatch=on_mismatch,
-    )
-
-    code = KERNEL_OUTLINE.safe_substitute(
-        inputs_type=inputs_type,
-        cam_type=cam_type,
-        results_type=results_type,
-        extra_params=extra_params,
-        loop_contents=loop_contents,
-        pre_loop=pre_loop,
-        post_loop=post_loop,
-    )
-
-    return cp.RawKernel(code=code, name="cam")
+    def generate_code(vectorized: bool) -> str:
+        if vectorized and is_packed:
+            loop_contents = PACKED_MATCHING_KINDS[variant].safe_substitute(
+                on_packed_mismatch=on_packed_mismatch
+            )
+        elif vectorized:
+            loop_contents = VECTORIZED_MATCHING.safe_substitute(
+                vector_loads=vector_loads.template,
+                lane_loads=lane_loads.template,
+                comparison=comparison.template,
+                after_lanes=after_lanes,
+            )
+        else:
+            loop_contents = scalar_loads.template + comparison.template
+
+        loop_contents = Template(loop_contents).safe_substitute(
+            inputs_type=inputs_type,
+            cam_type=cam_type,
+            inputs_vector_type=CTYPE_TO_VECTOR_CTYPE.get(inputs_type),
+            cam_vector_type=CTYPE_TO_VECTOR_CTYPE.get(cam_type),
+            on_mismatch=on_mismatch,
+        )
+
+        return KERNEL_OUTLINE.safe_substitute(
+            inputs_type=inputs_type,
+            cam_type=cam_type,
+            results_type=results_type,
+            extra_params=extra_params,
+            loop_contents=loop_contents,
+            pre_loop=pre_loop,
+            post_loop=post_loop,
+            columns_per_iteration=VECTOR_WIDTH if vectorized else 1,
+        )
+
+    vectorized = None
+    if inputs_type in CTYPE_TO_VECTOR_CTYPE and cam_type in CTYPE_TO_VECTOR_CTYPE:
+        vectorized = Kernel(cp.RawKernel(code=generate_code(True), name="cam"))
+
+    return Kernel(cp.RawKernel(code=generate_code(False), name="cam"), vectorized)
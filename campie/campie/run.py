@@ -1,50 +1,336 @@
 """Python wrapper around CAM kernels."""
 
-from math import ceil, prod
-from typing import Optional, Tuple
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import lru_cache
+from math import prod
+from typing import Any, ContextManager, List, NamedTuple, Optional, Tuple
 
 import cupy as cp
+import numpy as np
 from numpy.typing import DTypeLike, NDArray
 
-from .types import CamOp, CamVariant, Kernel
+from .types import (
+    MAX_PINNED_STAGING_BYTES,
+    VECTOR_WIDTH,
+    WARP_SIZE,
+    CamOp,
+    CamVariant,
+    Dimensions,
+    Kernel,
+    buffer_capacity,
+)
 
 
-def run_kernel(
-    kernel: Kernel,
-    variant: CamVariant,
-    op: CamOp,
-    inputs: NDArray,
-    cam: NDArray,
-    result_dtype: DTypeLike,
-    reduction_values: Optional[NDArray] = None,
-) -> NDArray:
+def _contiguous_strides(shape: Tuple[int, ...], itemsize: int) -> Tuple[int, ...]:
+    """Determines the strides (in bytes) of a C-contiguous array of a given shape."""
+
+    strides = []
+    stride = itemsize
+    for size in reversed(shape):
+        strides.append(stride)
+        stride *= size
+
+    return tuple(reversed(strides))
+
+
+_pinned_staging = threading.local()
+"""
+The pinned host buffer of every thread that inputs from the host are staged in before
+they are copied to the GPU, see `_upload`.
+"""
+
+
+def _upload(
+    x: np.ndarray, stage: bool = False, out: Optional[cp.ndarray] = None
+) -> cp.ndarray:
     """
-    This is the heart of this library's shape magic. This function does the following:
+    Copies a host array to the GPU as a one-dimensional, C-contiguous array, either into
+    `out` or a freshly allocated array.
 
-    1. Prepare the parameters needed to call a kernel generated by `generate_kernel`.
-       This includes both the launch configuration and the direct kernel function
-       parameters.
+    If `stage` is set, the array is staged in a page-locked (pinned) host buffer first,
+    as copies from pinned memory run at full bandwidth and asynchronously with respect
+    to the host. This is meant for arguments that are uploaded over and over again,
+    such as inputs. Every thread keeps a single staging buffer, which only ever grows
+    (see `buffer_capacity`) up to `MAX_PINNED_STAGING_BYTES` and is held until
+    `free_pinned_memory` is called. Arrays larger than that are copied directly.
+    """
 
-    2. Call the kernel
+    if not stage or x.nbytes > MAX_PINNED_STAGING_BYTES:
+        if out is None:
+            return cp.asarray(np.ascontiguousarray(x)).reshape(-1)
+        out.set(np.ascontiguousarray(x).reshape(-1))
+        return out
 
-    3. Ensure that the results are returned in the correct shape.
+    capacity, memory, event = getattr(_pinned_staging, "buffer", (0, None, None))
 
-    This function does so many things at once because they all depend on the same
-    "shape logic", which is harder to get right when split up all over the place.
+    # the previous copy out of the buffer may still be in flight
+    if event is not None:
+        event.synchronize()
 
-    The reason behind this is that the CUDA kernels themselves only support inputs with
-    equal dimensions for simplicity. This function makes the necessary calculations such
-    that asymmetrical dimensions are flattened down to symmetrical ones before the
-    kernel call, and restored later before returning the results.
+    if memory is None or capacity < x.nbytes:
+        capacity = buffer_capacity(x.nbytes)
+        memory = cp.cuda.alloc_pinned_memory(capacity)
+
+    # this also takes care of non-contiguous arrays without an extra copy
+    staged = np.frombuffer(memory, dtype=x.dtype, count=x.size)
+    np.copyto(staged.reshape(x.shape), x)
+
+    if out is None:
+        out = cp.empty(x.size, dtype=x.dtype)
+    out.set(staged)
+
+    _pinned_staging.buffer = (capacity, memory, cp.cuda.get_current_stream().record())
+
+    return out
+
+
+def free_pinned_memory() -> None:
     """
+    Releases the page-locked (pinned) host memory that the calling thread uses to stage
+    inputs from the host on their way to the GPU.
 
-    input_rows, cam_rows = inputs.shape[-2], cam.shape[-2]
-    columns = cam.shape[-1] // variant.cell_encoding_width
+    ### Returns:
+    `None`
+
+    ### Notes:
+    - Every thread that passes NumPy inputs to CAM operations holds a pinned buffer
+      of up to 64 MiB, which is reused across calls. Call this once a thread is done
+      with CAM operations on NumPy inputs to free it.
+    - Call `cupy.get_default_pinned_memory_pool().free_all_blocks()` afterwards to also
+      return the memory to the operating system.
+    """
+
+    _, _, event = getattr(_pinned_staging, "buffer", (0, None, None))
+
+    # make sure that the buffer is not freed while it is still copied from
+    if event is not None:
+        event.synchronize()
+
+    _pinned_staging.buffer = (0, None, None)
+
+
+def _flatten_device(x: NDArray, stage: bool = False) -> cp.ndarray:
+    """
+    Flattens an array into a one-dimensional, C-contiguous array on the GPU while
+    copying as little as possible. See `_upload` for `stage`.
+    """
+
+    if isinstance(x, cp.ndarray):
+        # contiguous device arrays can be flattened via a view, anything else needs a
+        # single device-to-device copy
+        if x.flags.c_contiguous:
+            return x.reshape(-1)
+        return cp.ascontiguousarray(x).reshape(-1)
+
+    # this results in exactly one host-to-device copy
+    return _upload(np.asarray(x), stage)
+
+
+def _use_stream(stream: Optional[cp.cuda.Stream]) -> ContextManager:
+    """
+    Makes `stream` the current stream for the duration of a `with` block, or keeps the
+    current stream as is if no stream is given.
+    """
+
+    return stream if stream is not None else nullcontext()
+
+
+def _canonicalize_shapes(
+    inputs_outer_shape: Tuple[int, ...], cam_outer_shape: Tuple[int, ...]
+) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """
+    Folds the outer shapes of inputs and CAM into their canonical form, which results
+    in the same kernel launch and memory layout while using as few dimensions
+    as possible.
+
+    This drops all dimensions of size one and fuses the dimensions that both shapes
+    have in common as well as the overhanging dimensions into a single dimension each.
+    Shapes that only differ by dimensions of size one become equal this way.
+
+    For example:
+
+    inputs_outer_shape = (1, 2, 4), cam_outer_shape = (2, 4)
+    --> (8,), (8,)
+
+    inputs_outer_shape = (5, 3, 1, 2), cam_outer_shape = (1, 2)
+    --> (15, 2), (2,)
+    """
+
+    shared_dims = min(len(inputs_outer_shape), len(cam_outer_shape))
+
+    def fold(shape: Tuple[int, ...]) -> Tuple[int, ...]:
+        sizes = [size for size in shape if size != 1]
+        return (prod(sizes),) if sizes else ()
+
+    def canonicalize(shape: Tuple[int, ...]) -> Tuple[int, ...]:
+        overhang_dims = len(shape) - shared_dims
+        return fold(shape[:overhang_dims]) + fold(shape[overhang_dims:])
+
+    return canonicalize(inputs_outer_shape), canonicalize(cam_outer_shape)
+
+
+@dataclass
+class KernelLaunchPlan:
+    """
+    Everything needed to launch a CAM kernel for a fixed set of shapes, as prepared by
+    `plan_kernel`. A plan can be launched repeatedly via `run_kernel_planned`, which
+    only copies new inputs into the plan's input buffer before launching the kernel.
+    """
+
+    kernel: Kernel
+    """The kernel to launch, which may be the vectorized variant of a kernel."""
+
+    inputs_shape: Tuple[int, ...]
+    """The shape of the inputs that the plan was made for."""
+
+    flat_inputs: cp.ndarray
+    """The flattened inputs on the GPU."""
+
+    flat_cam: cp.ndarray
+    """The flattened CAM on the GPU."""
+
+    columns: int
+    """The amount of columns per input and CAM row."""
+
+    extended_input_rows: int
+    """The amount of input rows per core, extended by the inputs overhang."""
+
+    extended_cam_rows: int
+    """The amount of CAM rows per core, extended by the CAM overhang."""
+
+    buffer: cp.ndarray
+    """The flat buffer that the kernel writes its results to."""
+
+    results: cp.ndarray
+    """A view of `buffer` in the shape that the results are returned as."""
+
+    reduction_values: Optional[cp.ndarray]
+    """The flattened reduction values on the GPU, given that the op is a reduction."""
+
+    dim_grid: Dimensions
+    """The grid dimensions of the kernel launch."""
+
+    dim_block: Dimensions
+    """The block dimensions of the kernel launch."""
+
+    owns_inputs: bool = False
+    """
+    Whether `flat_inputs` is owned by the plan. If this is not the case, it may be a
+    view of the caller's inputs, which must not be overwritten by new inputs.
+    """
+
+    launched: bool = False
+    """Whether the plan has been launched at least once."""
+
+    event: Optional[cp.cuda.Event] = None
+    """
+    An event recorded after the latest launch on an explicitly given stream, which can
+    be waited for right before the results are consumed.
+    """
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether the plan does not launch any threads, so no kernel call is needed."""
+
+        return prod(self.dim_grid) * prod(self.dim_block) == 0
+
+    @property
+    def args(self) -> Tuple[Any, ...]:
+        """The direct kernel function parameters."""
+
+        args: Tuple[Any, ...] = (
+            self.flat_inputs,
+            self.flat_cam,
+            self.columns,
+            self.extended_input_rows,
+            self.extended_cam_rows,
+            self.buffer,
+        )
+
+        if self.reduction_values is not None:
+            args += (self.reduction_values,)
+
+        return args
+
+
+class KernelLaunchConfig(NamedTuple):
+    """
+    The launch configuration and result layout of a CAM kernel, which only depend on
+    the shapes of its arguments (see `_compute_launch_config`).
+    """
+
+    columns: int
+    """The amount of columns per input and CAM row."""
+
+    extended_input_rows: int
+    """The amount of input rows per core, extended by the inputs overhang."""
+
+    extended_cam_rows: int
+    """The amount of CAM rows per core, extended by the CAM overhang."""
+
+    results_shape: Tuple[int, ...]
+    """The shape that the results are finally returned as."""
+
+    canonical_results_shape: Tuple[int, ...]
+    """The shape of the results for the canonical form of the outer shapes."""
+
+    canonical_results_strides: Tuple[int, ...]
+    """
+    The strides (in elements) of the canonical results within the flat buffer written
+    by the kernel.
+    """
+
+    is_symmetric: bool
+    """
+    Whether the canonical outer shapes of inputs and CAM are equal, in which case the
+    kernel writes the results in the order that they are returned in.
+    """
+
+    dim_grid: Dimensions
+    """The grid dimensions of the kernel launch."""
+
+    dim_block: Dimensions
+    """The block dimensions of the kernel launch."""
+
+
+@lru_cache(maxsize=128)
+def _compute_launch_config(
+    inputs_shape: Tuple[int, ...],
+    cam_shape: Tuple[int, ...],
+    cell_encoding_width: int,
+    block_size: int,
+    is_reduction: bool,
+) -> KernelLaunchConfig:
+    """
+    Computes the launch configuration of a CAM kernel and the layout of its results.
+    This is the pure shape logic of `plan_kernel`, which is cached because the same
+    shapes tend to be used over and over again within loops.
+
+    `block_size` is the upper bound for the amount of threads per block. If there are
+    no threads to launch, all launch dimensions are zero.
+    """
+
+    input_rows, cam_rows = inputs_shape[-2], cam_shape[-2]
+    columns = cam_shape[-1] // cell_encoding_width
 
     # while the two innermost shapes of `inputs` and `cam` are `input_rows x columns`
     # and `cam_rows x columns` respectively, the remaining outer shapes hold all the
     # information on how the inputs are stacked and to be broadcasted.
-    inputs_outer_shape, cam_outer_shape = inputs.shape[:-2], cam.shape[:-2]
+    inputs_outer_shape, cam_outer_shape = inputs_shape[:-2], cam_shape[:-2]
+
+    # the shape that the results are finally returned as
+    results_shape = max(inputs_outer_shape, cam_outer_shape, key=len) + (
+        (input_rows,) if is_reduction else (input_rows, cam_rows)
+    )
+
+    # all of the shape logic below operates on the canonical form of the outer shapes
+    # (see `_canonicalize_shapes`). This turns many asymmetrical stacks into
+    # symmetrical ones and keeps the remaining ones as flat as possible.
+    inputs_outer_shape, cam_outer_shape = _canonicalize_shapes(
+        inputs_outer_shape, cam_outer_shape
+    )
 
     # sort the outer shapes by length. we expect the smaller shape (`sub_shape`) to be
     # a subset of the larger shape (`super_shape`) as the name suggests.
@@ -84,119 +370,428 @@ def run_kernel(
     inputs_overhang = prod(overhang(inputs_outer_shape))
     cam_overhang = prod(overhang(cam_outer_shape))
 
-    is_reduction = op.is_reduction
-
-    results_shape = super_shape + (
+    canonical_results_shape = super_shape + (
         (input_rows,) if is_reduction else (input_rows, cam_rows)
     )
 
-    # allocate the required space for the results in the shape that they will
-    # finally be returned as. Even though the kernel will always interpret `results`
-    # in the context of an even stack, the buffer is the same size and the shape is
-    # not relevant to the CUDA code.
-    results = cp.zeros(
-        results_shape,
-        dtype=result_dtype,  # type: ignore (https://github.com/cupy/cupy/pull/7702)
-    )
+    # the kernel always writes its results linearly in the context of an even stack,
+    # which for asymmetrical stacks is not the order in which the results need to be
+    # returned.
+    # there are three different cases for the shapes of the parameters taken by the
+    # CAM functions:
+    #
+    # 1. The shapes of `inputs` and `cam` are equal.
+    # 2. The shape of `inputs` supersets the shape of `cam`.
+    # 3. The shape of `cam` supersets the shape of `inputs`.
+    #
+    # case 1 works fine because the kernels themselves are built to directly handle it.
+    # for case 2 and 3 each, the memory written by the kernel is laid out such that
+    # the overhanging dimensions are placed behind the sub shape, in front of the
+    # dimension that was modified during the kernel call because of the overhang.
+    # For case 2, this is in front of `input_rows` and for case 3, in front of
+    # `cam_rows`.
+    #
+    # instead of rearranging the results after the kernel call, `results` is directly
+    # allocated as a strided view of the kernel's memory layout, such that it already
+    # appears in the correct shape without any further copies.
+    match_dims = len(canonical_results_shape)
+    sub_shape_dims = len(sub_shape)
 
-    # CuPy kindly provides this information such that we don't need to hardcode / guess
-    # the value.
-    # Depending on the GPU, this is typically 512 or 1024.
-    max_threads_per_block = kernel.attributes["max_threads_per_block"]
+    # case 1
+    if len(inputs_outer_shape) == len(cam_outer_shape):
+        kernel_shape = canonical_results_shape
+        permutation = tuple(range(match_dims))
+
+    # case 2
+    elif len(inputs_outer_shape) > len(cam_outer_shape):
+        # the overhang is placed behind the sub shape and in front of the input rows
+        kernel_shape = (*sub_shape, *overhang(super_shape), input_rows, cam_rows)
+        permutation = (
+            *range(sub_shape_dims, match_dims - 2),  # move overhang in front
+            *range(sub_shape_dims),  # move sub shape behind overhang
+            match_dims - 2,  # keep input rows in place
+            match_dims - 1,  # keep cam rows in place
+        )
+
+    # case 3
+    else:
+        # the overhang is placed behind the sub shape and the input rows and in front
+        # of the cam rows
+        kernel_shape = (*sub_shape, input_rows, *overhang(super_shape), cam_rows)
+        permutation = (
+            *range(sub_shape_dims + 1, match_dims - 1),  # move overhang in front
+            *range(sub_shape_dims),  # move sub shape behind overhang
+            sub_shape_dims,  # move input rows back in front of cam rows
+            match_dims - 1,  # keep cam rows in place
+        )
+
+    kernel_strides = _contiguous_strides(kernel_shape, 1)
 
     # a core = a single inputs/CAM pair within the operation stack
     # each core calculates a single point in a `input_rows x cam_rows` match matrix,
     # where we need to account for overhangs generates from asymmetrical stacks.
     threads_per_core = input_rows * inputs_overhang * cam_rows * cam_overhang
 
-    # this is the edge case where we have less threads per core than what would fill
-    # a single block.
-    threads_per_block = min(threads_per_core, max_threads_per_block)
+    # the block size is determined via the CUDA occupancy API, which is typically
+    # lower than the maximum amount of threads per block.
+    # for the edge case where we have less threads per core than what would fill
+    # a single block, the block is shrunk to the smallest multiple of the warp size
+    # that covers all threads, as partial warps are scheduled as whole warps anyway.
+    threads_per_block = min(
+        (threads_per_core + WARP_SIZE - 1) // WARP_SIZE * WARP_SIZE, block_size
+    )
 
     # the `x` dimensions of `dim_block` and `dim_grid` generate `threads_per_core`
     # threads.
     # the `y` dimension of `dim_grid` accounts for the amount of cores, which given
     # an even stack is equal to `prod(sub_shape)`.
-    dim_block = (threads_per_block, 1, 1)
-    dim_grid = (ceil(threads_per_core / threads_per_block), prod(sub_shape), 1)
-
-    kernel_args = (
-        # make sure to move inputs and CAM to the GPU, this no-ops if they
-        # are already on the device
-        cp.asarray(inputs.ravel()),
-        cp.asarray(cam.ravel()),
-        columns,
+    cores = prod(sub_shape)
+    if threads_per_core == 0 or cores == 0:
+        dim_block: Dimensions = (0, 0, 0)
+        dim_grid: Dimensions = (0, 0, 0)
+    else:
+        dim_block = (threads_per_block, 1, 1)
+        blocks_per_core = (
+            threads_per_core + threads_per_block - 1
+        ) // threads_per_block
+        dim_grid = (blocks_per_core, cores, 1)
+
+    return KernelLaunchConfig(
+        columns=columns,
         # the CAM kernels operate on even shapes, so the overhang needs to be
         # accounted for by extending the rows.
-        input_rows * inputs_overhang,
-        cam_rows * cam_overhang,
-        results,
+        extended_input_rows=input_rows * inputs_overhang,
+        extended_cam_rows=cam_rows * cam_overhang,
+        results_shape=results_shape,
+        canonical_results_shape=canonical_results_shape,
+        canonical_results_strides=tuple(kernel_strides[axis] for axis in permutation),
+        is_symmetric=len(inputs_outer_shape) == len(cam_outer_shape),
+        dim_grid=dim_grid,
+        dim_block=dim_block,
     )
 
-    if is_reduction:
-        assert reduction_values is not None
-        kernel_args += (cp.asarray(reduction_values.ravel()),)
 
-    # call the CUDA kernel. this will mutate `results` in place.
-    kernel(dim_grid, dim_block, kernel_args)
+def plan_kernel(
+    kernel: Kernel,
+    variant: CamVariant,
+    op: CamOp,
+    inputs: NDArray,
+    cam: NDArray,
+    result_dtype: DTypeLike,
+    reduction_values: Optional[NDArray] = None,
+    reuse_buffer: bool = False,
+) -> KernelLaunchPlan:
+    """
+    This is the heart of this library's shape magic. This function prepares everything
+    needed to call a kernel generated by `generate_kernel`:
 
-    # this is the final special case where the kernel has placed the correct values
-    # in `results` but it needs to be rearranged such that they also appear in the
-    # correct place.
-    # there are three different cases for the shapes of the parameters taken by the
-    # CAM functions:
-    #
-    # 1. The shapes of `inputs` and `cam` are equal.
-    # 2. The shape of `inputs` supersets the shape of `cam`.
-    # 3. The shape of `cam` supersets the shape of `inputs`.
-    #
-    # case 1 works fine because the kernels themselves are built to directly handle it.
-    # for case 2 and 3 each, `results` needs to be reshaped and transposed such that
-    # the results correctly propagate across the overhanging dimensions.
-    #
-    # the algorithm here is as follows:
-    #
-    # 1. reshape `results` such that the overhanging dimensions are moved in front of
-    #    the dimension that was initially modified during the kernel call because of
-    #    the overhang. For case 2, this is in front of `input_rows` and for case 3,
-    #    in front of `cam_rows`.
-    #
-    # 2. transpose `results` such that the dimensions go back into correct order.
+    1. The launch configuration.
 
-    # case 1, nothing needs to be done
-    if len(inputs_outer_shape) == len(cam_outer_shape):
-        return results
+    2. The direct kernel function parameters.
 
-    match_dims = len(results.shape)
-    sub_shape_dims = len(sub_shape)
+    3. A view of the results that ensures they are returned in the correct shape.
 
-    # case 2
-    if len(inputs_outer_shape) > len(cam_outer_shape):
-        # move the overhang behind the sub shape and in front of the input rows
-        results = results.reshape(
-            (*sub_shape, *overhang(super_shape), input_rows, cam_rows)
+    This function does so many things at once because they all depend on the same
+    "shape logic", which is harder to get right when split up all over the place.
+    The shape logic itself is found in `_compute_launch_config`, which caches it for
+    repeated calls with the same shapes.
+
+    The reason behind this is that the CUDA kernels themselves only support inputs with
+    equal dimensions for simplicity. This function makes the necessary calculations such
+    that asymmetrical dimensions are flattened down to symmetrical ones before the
+    kernel call, and restored later before returning the results.
+
+    If `reuse_buffer` is set, the results are placed in the scratch buffer of the
+    kernel (see `Kernel.scratch`) instead of a freshly allocated one. This avoids
+    allocations in tight loops, but the results are only valid until the next call
+    that reuses the buffer on the same thread.
+
+    The arguments are expected to have been checked via `validate_args`. Contiguous
+    reduction values on the GPU are used in place, so callers that keep them resident
+    on the GPU across calls avoid uploading them again.
+    """
+
+    is_reduction = op.is_reduction
+
+    # if any of the stacked dimensions or rows is empty, there are no threads to launch
+    # and the results already are final. This is checked before anything is moved to
+    # the GPU, which avoids the copies in addition to the launch.
+    # note that reductions over an empty CAM still produce zeros for every input row.
+    if 0 in inputs.shape[:-1] or 0 in cam.shape[:-1]:
+        config = _compute_launch_config(
+            inputs.shape,
+            cam.shape,
+            variant.cell_encoding_width,
+            kernel.optimal_block_size,
+            is_reduction,
         )
-        # transpose the dimensions back into the right order
-        results = results.transpose(
-            *range(sub_shape_dims, match_dims - 2),  # move overhang in front
-            *range(sub_shape_dims),  # move sub shape behing overhang
-            match_dims - 2,  # keep input rows in place
-            match_dims - 1,  # keep cam rows in place
+        buffer = cp.zeros(
+            prod(config.results_shape),
+            dtype=result_dtype,  # type: ignore (https://github.com/cupy/cupy/pull/7702)
+        )
+        return KernelLaunchPlan(
+            kernel=kernel,
+            inputs_shape=inputs.shape,
+            flat_inputs=cp.empty(0, dtype=inputs.dtype),
+            flat_cam=cp.empty(0, dtype=cam.dtype),
+            owns_inputs=True,
+            columns=config.columns,
+            extended_input_rows=config.extended_input_rows,
+            extended_cam_rows=config.extended_cam_rows,
+            buffer=buffer,
+            results=buffer.reshape(config.results_shape),
+            reduction_values=None,
+            dim_grid=config.dim_grid,
+            dim_block=config.dim_block,
         )
 
-    # case 3
+    # make sure to move inputs and CAM to the GPU, this no-ops if they
+    # are already contiguous on the device
+    # only inputs are staged in pinned memory, as a CAM typically is uploaded once
+    flat_inputs = _flatten_device(inputs, stage=True)
+    flat_cam = _flatten_device(cam)
+
+    # the scratch buffer always belongs to the given kernel, such that
+    # `Kernel.clear_scratch` on it releases the buffer regardless of the variant used.
+    base_kernel = kernel
+
+    # the vectorized variant of the kernel loads multiple columns at once, which is
+    # only possible if the rows split evenly into vectors that are properly aligned.
+    # memory from CuPy's pool is always aligned sufficiently, views may not be.
+    columns = cam.shape[-1] // variant.cell_encoding_width
+    if kernel.vectorized is not None and columns % VECTOR_WIDTH == 0:
+        alignment = VECTOR_WIDTH * flat_inputs.itemsize
+        if flat_inputs.data.ptr % alignment == 0 and flat_cam.data.ptr % alignment == 0:
+            kernel = kernel.vectorized
+
+    config = _compute_launch_config(
+        inputs.shape,
+        cam.shape,
+        variant.cell_encoding_width,
+        kernel.optimal_block_size,
+        is_reduction,
+    )
+
+    # allocate the required space for the results as a flat buffer, which is what
+    # the kernel operates on. `results` is a view of the same memory in the canonical
+    # shape of the results.
+    # non-reductions write every single element of the results, so the buffer does
+    # not need to be zeroed beforehand. Reductions accumulate into the buffer via
+    # atomics, which requires it to start out at zero.
+    if reuse_buffer:
+        dtype = np.dtype(result_dtype)
+        size = prod(config.results_shape)
+        memptr = base_kernel.scratch(size * dtype.itemsize)
+        buffer = cp.ndarray((size,), dtype=dtype, memptr=memptr)
+        if is_reduction:
+            buffer.fill(0)
     else:
-        # move the overhang behind the sub shape and the input rows and in front of the
-        # cam rows
-        results = results.reshape(
-            (*sub_shape, input_rows, *overhang(super_shape), cam_rows)
+        allocate = cp.zeros if is_reduction else cp.empty
+        buffer = allocate(
+            prod(config.results_shape),
+            dtype=result_dtype,  # type: ignore (https://github.com/cupy/cupy/pull/7702)
         )
-        # transpose the dimensions back into the right order
-        results = results.transpose(
-            *range(sub_shape_dims + 1, match_dims - 1),  # move overhang in front
-            *range(sub_shape_dims),  # move sub shape behind overhang
-            sub_shape_dims,  # move input rows back in front of cam rows
-            match_dims - 1,  # keep cam rows in place
+    # symmetric stacks are by far the most common ones. Their results are laid out
+    # contiguously, so the buffer can be reshaped directly.
+    if config.is_symmetric:
+        results = buffer.reshape(config.results_shape)
+    else:
+        # restore the dimensions that were dropped or fused in the canonical shape.
+        # this only splits axes and inserts axes of size one, so it never copies.
+        results = cp.ndarray(
+            config.canonical_results_shape,
+            dtype=result_dtype,
+            memptr=buffer.data,
+            strides=tuple(
+                stride * buffer.itemsize for stride in config.canonical_results_strides
+            ),
+        ).reshape(config.results_shape)
+
+    if is_reduction:
+        assert reduction_values is not None
+        reduction_values = _flatten_device(reduction_values)
+
+    return KernelLaunchPlan(
+        kernel=kernel,
+        inputs_shape=inputs.shape,
+        flat_inputs=flat_inputs,
+        flat_cam=flat_cam,
+        # inputs from the host are always copied into a fresh buffer
+        owns_inputs=not isinstance(inputs, cp.ndarray),
+        columns=config.columns,
+        extended_input_rows=config.extended_input_rows,
+        extended_cam_rows=config.extended_cam_rows,
+        buffer=buffer,
+        results=results,
+        reduction_values=reduction_values,
+        dim_grid=config.dim_grid,
+        dim_block=config.dim_block,
+    )
+
+
+def run_kernel_planned(
+    plan: KernelLaunchPlan,
+    new_inputs: Optional[NDArray] = None,
+    stream: Optional[cp.cuda.Stream] = None,
+) -> NDArray:
+    """
+    Launches the kernel of a plan made by `plan_kernel` and returns its results.
+
+    If `new_inputs` are given, they replace the inputs that the plan was made for and
+    need to be of the same shape and data type. They are copied into a buffer owned by
+    the plan, such that nothing but the copy and the kernel launch itself take place.
+
+    Note that the results always are a view of the same buffer, which means that every
+    launch overwrites the results of the previous launch of the same plan.
+
+    If a `stream` is given, copying the new inputs and the launch are enqueued on it,
+    such that they can overlap with work on other streams, and `plan.event` is
+    recorded right after. Copies from the host only overlap with other work if the
+    host memory is pinned. A plan must not be launched on multiple streams at once,
+    as its buffers are shared between launches.
+    """
+
+    if new_inputs is not None:
+        if new_inputs.shape != plan.inputs_shape:
+            raise ValueError(
+                f"inputs shape does not match the planned shape: {new_inputs.shape} vs {plan.inputs_shape}"  # noqa: E501
+            )
+
+        if new_inputs.dtype != plan.flat_inputs.dtype:
+            raise TypeError(
+                f"inputs dtype does not match the planned dtype: ({new_inputs.dtype} vs {plan.flat_inputs.dtype})"  # noqa: E501
+            )
+
+    # empty plans never launch a kernel, so their results are already final and new
+    # inputs (which are empty as well) do not need to be copied anywhere.
+    if plan.is_empty:
+        return plan.results
+
+    with _use_stream(stream):
+        if new_inputs is not None:
+            # never write into the caller's original inputs
+            if not plan.owns_inputs:
+                plan.flat_inputs = cp.empty_like(plan.flat_inputs)
+                plan.owns_inputs = True
+
+            if isinstance(new_inputs, cp.ndarray):
+                cp.copyto(plan.flat_inputs, new_inputs.reshape(-1))
+            else:
+                _upload(np.asarray(new_inputs), stage=True, out=plan.flat_inputs)
+
+        # reductions accumulate into the results, so they need to start out at zero
+        # for every launch. For the first launch, this already happened during
+        # allocation.
+        if plan.reduction_values is not None and plan.launched:
+            plan.buffer.fill(0)
+
+        # call the CUDA kernel. this will mutate `buffer` and thereby `results` in
+        # place.
+        plan.kernel(plan.dim_grid, plan.dim_block, plan.args)
+        plan.launched = True
+
+        if stream is not None:
+            plan.event = stream.record()
+
+    return plan.results
+
+
+def run_kernel(
+    kernel: Kernel,
+    variant: CamVariant,
+    op: CamOp,
+    inputs: NDArray,
+    cam: NDArray,
+    result_dtype: DTypeLike,
+    reduction_values: Optional[NDArray] = None,
+    reuse_buffer: bool = False,
+    stream: Optional[cp.cuda.Stream] = None,
+) -> NDArray:
+    """
+    Plans and launches a kernel generated by `generate_kernel` a single time and
+    returns the results. See `plan_kernel` for the details.
+
+    If a `stream` is given, moving the arguments to the GPU and the launch are enqueued
+    on it, such that the results are only ready once the stream (or an event recorded
+    on it) has been synchronized. Otherwise, the current stream is used.
+    """
+
+    # the plan already moves the arguments to the GPU, so it needs to be made on the
+    # same stream as the launch
+    with _use_stream(stream):
+        plan = plan_kernel(
+            kernel,
+            variant,
+            op,
+            inputs,
+            cam,
+            result_dtype,
+            reduction_values,
+            reuse_buffer,
         )
 
-    return results
+    return run_kernel_planned(plan, stream=stream)
+
+
+def run_kernel_batched(
+    kernel: Kernel,
+    variant: CamVariant,
+    op: CamOp,
+    inputs_list: List[NDArray],
+    cam: NDArray,
+    result_dtype: DTypeLike,
+    reduction_values: Optional[NDArray] = None,
+    reuse_buffer: bool = False,
+    stream: Optional[cp.cuda.Stream] = None,
+) -> List[NDArray]:
+    """
+    Runs a kernel generated by `generate_kernel` for a batch of inputs against the same
+    CAM in a single launch and returns the results for every batch entry, in the same
+    shape that `run_kernel` would return them in.
+
+    All inputs need to share the same outer shape, columns and data type, but may
+    differ in their amount of rows. They are concatenated along the input rows, which
+    only extends the rows of every core. This works for any stack that `run_kernel`
+    supports, as opposed to stacking the batch along a new outer dimension, which turns
+    into an overhang whenever a single CAM is shared by the entire batch.
+
+    The results of all batch entries are views of the same buffer. See `run_kernel`
+    for `stream`.
+    """
+
+    if not inputs_list:
+        return []
+
+    # concatenate inputs from the host on the host, such that they are moved to the
+    # GPU in a single copy
+    if all(isinstance(inputs, np.ndarray) for inputs in inputs_list):
+        inputs = np.concatenate(inputs_list, axis=-2)
+    else:
+        with _use_stream(stream):
+            inputs = cp.concatenate(
+                [cp.asarray(inputs) for inputs in inputs_list], axis=-2
+            )
+
+    results = run_kernel(
+        kernel,
+        variant,
+        op,
+        inputs,
+        cam,
+        result_dtype,
+        reduction_values,
+        reuse_buffer,
+        stream,
+    )
+
+    # split the results back up along the input rows, which is the innermost dimension
+    # for reductions and the second innermost one otherwise
+    trailing = () if op.is_reduction else (slice(None),)
+    batch_results = []
+    start = 0
+    for inputs in inputs_list:
+        end = start + inputs.shape[-2]
+        batch_results.append(results[(..., slice(start, end), *trailing)])
+        start = end
+
+    return batch_results
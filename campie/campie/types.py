@@ -1,6 +1,9 @@
+import threading
 from enum import Enum, auto
-from typing import Any, Callable, Optional, Tuple, Union
+from functools import cached_property
+from typing import Any, Optional, Tuple, Union
 
+import cupy as cp
 import numpy as np
 from numpy.typing import DTypeLike, NDArray
 
@@ -95,8 +98,103 @@ Dimensions = Tuple[int, int, int]
 LaunchConfiguration = Tuple[Dimensions, Dimensions]
 """A CUDA kernel launch configuration in `(dim_grid, dim_block)` format."""
 
-Kernel = Callable[[Dimensions, Dimensions, Tuple[Any, ...]], None]
-"""A `cupy.RawKernel` instance."""
+WARP_SIZE = 32
+"""The amount of threads in a CUDA warp."""
+
+VECTOR_WIDTH = 4
+"""The amount of elements loaded at once by vectorized kernels."""
+
+MAX_PINNED_STAGING_BYTES = 64 * 1024 * 1024
+"""
+The largest host array that is staged in a pinned buffer before it is copied to the
+GPU. Larger arrays are copied directly, so that every thread holds at most this much
+page-locked host memory for staging.
+"""
+
+
+def buffer_capacity(nbytes: int) -> int:
+    """
+    Determines the capacity of a reusable buffer that needs to hold at least `nbytes`
+    bytes. Capacities are rounded up to powers of two, such that repeated requests with
+    varying sizes settle on a single allocation when the buffer only ever grows.
+    """
+
+    return 1 << max(nbytes - 1, 0).bit_length()
+
+
+class Kernel:
+    """
+    A thin wrapper around a `cupy.RawKernel` instance that caches attributes which
+    would otherwise be queried from the CUDA driver on every kernel launch.
+    """
+
+    def __init__(
+        self, raw_kernel: cp.RawKernel, vectorized: Optional["Kernel"] = None
+    ) -> None:
+        self.raw_kernel = raw_kernel
+        self.vectorized = vectorized
+        """
+        An optional variant of the kernel that loads `VECTOR_WIDTH` columns at once.
+        It may only be used if the amount of columns is divisible by `VECTOR_WIDTH`
+        and the arguments are aligned to `VECTOR_WIDTH * itemsize` bytes.
+        """
+        self._scratch = threading.local()
+
+    def __call__(
+        self, dim_grid: Dimensions, dim_block: Dimensions, args: Tuple[Any, ...]
+    ) -> None:
+        self.raw_kernel(dim_grid, dim_block, args)
+
+    @cached_property
+    def max_threads_per_block(self) -> int:
+        """
+        The maximum amount of threads per block that the kernel can be launched with.
+        Depending on the GPU, this is typically 512 or 1024.
+        """
+        return self.raw_kernel.attributes["max_threads_per_block"]
+
+    @cached_property
+    def optimal_block_size(self) -> int:
+        """
+        The block size that maximizes the occupancy of the GPU for this kernel, as
+        determined by the CUDA occupancy API. Unlike `max_threads_per_block`, this
+        accounts for the register and shared memory pressure of the kernel.
+        The value is always a multiple of the warp size.
+        """
+        _, block_size = cp.cuda.driver.occupancyMaxPotentialBlockSize(
+            self.raw_kernel.kernel.ptr, 0, self.max_threads_per_block
+        )
+        return max(WARP_SIZE, block_size // WARP_SIZE * WARP_SIZE)
+
+    def scratch(self, nbytes: int) -> cp.cuda.MemoryPointer:
+        """
+        Returns a scratch buffer of at least `nbytes` bytes on the current GPU, which is
+        reused across calls from the same thread on the same device. The buffer only
+        ever grows (see `buffer_capacity`).
+        """
+
+        buffers = getattr(self._scratch, "buffers", None)
+        if buffers is None:
+            buffers = self._scratch.buffers = {}
+
+        device_id = cp.cuda.Device().id
+        capacity, memptr = buffers.get(device_id, (0, None))
+
+        if memptr is None or capacity < nbytes:
+            capacity = buffer_capacity(nbytes)
+            memptr = cp.cuda.alloc(capacity)
+            buffers[device_id] = (capacity, memptr)
+
+        return memptr
+
+    def clear_scratch(self) -> None:
+        """
+        Releases the scratch buffers of the calling thread on all devices back to CuPy's
+        memory pool. Call `cupy.get_default_memory_pool().free_all_blocks()` afterwards
+        to also return the memory to the GPU.
+        """
+        self._scratch.buffers = {}
+
 
 DTYPE_TO_CTYPE = {
     np.float32: "float",
@@ -112,6 +210,19 @@ DTYPE_TO_CTYPE = {
 }
 """Lookup table for numpy dtypes -> their type name in C."""
 
+CTYPE_TO_VECTOR_CTYPE = {
+    "char": "char4",
+    "short": "short4",
+    "unsigned short": "ushort4",
+    "int": "int4",
+    "unsigned int": "uint4",
+    "float": "float4",
+}
+"""
+Lookup table for C types -> their CUDA vector type of `VECTOR_WIDTH` elements.
+Only includes types whose vector type is aligned to its full size.
+"""
+
 
 def dtype_to_ctype(dtype: DTypeLike) -> str:
     """Converts a numpy dtype to the name of its counterpart in C."""
@@ -3,8 +3,10 @@ This module includes additional utility functionality related to CAMs,
 implemented as CUDA kernels.
 """
 
+from ..run import free_pinned_memory
 from .flip_indices import flip_indices
 
 __all__ = [
     "flip_indices",
+    "free_pinned_memory",
 ]
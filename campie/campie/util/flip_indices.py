@@ -2,12 +2,13 @@
 This module contains the `flip_indices` utility function CUDA kernel and public API.
 """
 
+from functools import lru_cache
 from string import Template
 
 import cupy as cp
 from numpy.typing import DTypeLike, NDArray
 
-from ..types import IntDType, NumericDType, dtype_to_ctype, is_float_type
+from ..types import IntDType, Kernel, NumericDType, dtype_to_ctype, is_float_type
 from .helpers import simple_kernel_dimensions
 
 # Kernel notes:
@@ -45,8 +46,9 @@ void flip_indices(
 )
 
 
-def generate_kernel(inputs_dtype: DTypeLike, indices_dtype: DTypeLike):
-    """Converts the generic source template into an instance of `cp.RawKernel`"""
+@lru_cache(maxsize=128)
+def generate_kernel(inputs_dtype: DTypeLike, indices_dtype: DTypeLike) -> Kernel:
+    """Converts the generic source template into a cached, callable kernel"""
 
     if is_float_type(indices_dtype):
         raise TypeError(f"data type of indices is not an integer ({indices_dtype})")
@@ -56,7 +58,7 @@ def generate_kernel(inputs_dtype: DTypeLike, indices_dtype: DTypeLike):
         indices_type=dtype_to_ctype(indices_dtype),
     )
 
-    return cp.RawKernel(code=code, name="flip_indices")
+    return Kernel(cp.RawKernel(code=code, name="flip_indices"))
 
 
 def flip_indices(inputs: NDArray[NumericDType], indices: NDArray[IntDType]) -> None:
@@ -101,7 +103,7 @@ def flip_indices(inputs: NDArray[NumericDType], indices: NDArray[IntDType]) -> N
 
     dims = simple_kernel_dimensions(
         input_rows * index_cols,  # one thread per index in the (repeated) indices array
-        kernel.attributes["max_threads_per_block"],
+        kernel.max_threads_per_block,
     )
 
     indices = cp.asarray(indices.ravel())  # move `indices` to the GPU if needed
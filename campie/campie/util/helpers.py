@@ -1,7 +1,5 @@
 """Helper functionality."""
 
-from math import ceil
-
 from ..types import LaunchConfiguration
 
 
@@ -17,7 +15,7 @@ def simple_kernel_dimensions(
         return ((0, 0, 0), (0, 0, 0))
 
     threads_per_block = min(threads_needed, max_threads_per_block)
-    blocks_per_grid = ceil(threads_needed / threads_per_block)
+    blocks_per_grid = (threads_needed + threads_per_block - 1) // threads_per_block
 
     dim_grid = (blocks_per_grid, 1, 1)
     dim_block = (threads_per_block, 1, 1)
@@ -0,0 +1,122 @@
+"""
+Checks that the vectorized kernels produce exactly the same results as the scalar
+kernels that they are derived from.
+
+These tests require a GPU and are skipped otherwise.
+"""
+
+import itertools
+import unittest
+
+import numpy as np
+
+try:
+    import cupy as cp
+
+    from campie.kernel import generate_kernel
+    from campie.run import plan_kernel, run_kernel
+    from campie.types import CamOp, CamVariant, Kernel, is_float_type
+
+    HAS_GPU = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:  # cupy is not installed or there is no usable GPU
+    HAS_GPU = False
+
+DTYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32, np.float32]
+
+INPUT_ROWS, CAM_ROWS, COLUMNS = 37, 53, 24
+
+
+def result_dtype(op, values_dtype):
+    return {
+        CamOp.MATCH: np.int8,
+        CamOp.COUNT_MISMATCHES: np.int64,
+        CamOp.REDUCE_SUM: values_dtype,
+    }[op]
+
+
+def random_args(rng, variant, dtype):
+    """
+    Generates random inputs and a random CAM of `dtype` that contain plenty of
+    matches, mismatches and "Don't Care" cells. Every fourth CAM row is derived from
+    an input row, such that it is likely to match entirely.
+    """
+
+    derived = np.arange(0, CAM_ROWS, 4)
+    sources = derived % INPUT_ROWS
+    unsigned = np.issubdtype(dtype, np.unsignedinteger)
+
+    if variant == CamVariant.TCAM:
+        inputs = rng.integers(0, 2, (INPUT_ROWS, COLUMNS))
+        # both -1 and 2 are "Don't Care" for integers, floats use NaN instead
+        cam = rng.integers(-1, 3, (CAM_ROWS, COLUMNS))
+        dont_care = (cam[derived] < 0) | (cam[derived] > 1)
+        cam[derived] = np.where(dont_care, cam[derived], inputs[sources])
+        if is_float_type(dtype):
+            cam = np.where((cam < 0) | (cam > 1), np.nan, cam)
+        elif unsigned:
+            cam = np.where(cam < 0, 2, cam)
+        return inputs.astype(dtype), cam.astype(dtype)
+
+    # thresholds are drawn around the inputs, a negative threshold (or NaN for floats)
+    # is a "Don't Care" for the respective bound
+    inputs = rng.integers(0, 8, (INPUT_ROWS, COLUMNS))
+    lower = rng.integers(-2, 8, (CAM_ROWS, COLUMNS))
+    upper = lower + rng.integers(0, 4, (CAM_ROWS, COLUMNS))
+    lower[derived] = inputs[sources] - rng.integers(0, 2, (len(derived), COLUMNS))
+    upper[derived] = inputs[sources] + rng.integers(1, 3, (len(derived), COLUMNS))
+    upper[rng.random((CAM_ROWS, COLUMNS)) < 0.2] = -1
+
+    cam = np.empty((CAM_ROWS, COLUMNS * 2), dtype=np.float64)
+    cam[:, 0::2], cam[:, 1::2] = lower, upper
+    if is_float_type(dtype):
+        cam = np.where(cam < 0, np.nan, cam)
+    elif unsigned:
+        # unsigned integers cannot encode "Don't Care", so use the widest bounds
+        cam[:, 0::2] = np.maximum(cam[:, 0::2], 0)
+        cam[:, 1::2] = np.where(cam[:, 1::2] < 0, np.iinfo(dtype).max, cam[:, 1::2])
+    return inputs.astype(dtype), cam.astype(dtype)
+
+
+@unittest.skipUnless(HAS_GPU, "no GPU available")
+class TestVectorizedKernels(unittest.TestCase):
+    def test_vectorized_matches_scalar(self):
+        rng = np.random.default_rng(0)
+        cases = itertools.product(CamVariant, CamOp, DTYPES)
+
+        for variant, op, dtype in cases:
+            with self.subTest(variant=variant, op=op, dtype=np.dtype(dtype).name):
+                # integer valued sums are exact regardless of the order of additions
+                values = rng.integers(0, 16, CAM_ROWS).astype(np.float32)
+                results_dtype = result_dtype(op, values.dtype)
+                kernel = generate_kernel(variant, op, dtype, dtype, results_dtype)
+                if kernel.vectorized is None:
+                    continue
+
+                inputs, cam = random_args(rng, variant, dtype)
+                reduction_values = values if op.is_reduction else None
+
+                plan = plan_kernel(
+                    kernel, variant, op, inputs, cam, results_dtype, reduction_values
+                )
+                self.assertIs(plan.kernel, kernel.vectorized)
+
+                expected = run_kernel(
+                    Kernel(kernel.raw_kernel),
+                    variant,
+                    op,
+                    inputs,
+                    cam,
+                    results_dtype,
+                    reduction_values,
+                )
+                actual = run_kernel(
+                    kernel, variant, op, inputs, cam, results_dtype, reduction_values
+                )
+
+                np.testing.assert_array_equal(cp.asnumpy(actual), cp.asnumpy(expected))
+                # guard against trivially equal results
+                self.assertGreater(len(np.unique(cp.asnumpy(expected))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Checks the cached shape logic of `run.py` against the reshape/transpose that
+`run_kernel` used to apply to the results after every kernel call.
+
+These tests only inspect shapes and strides, so they run without a GPU.
+"""
+
+import itertools
+import unittest
+from math import prod
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    from campie.run import _canonicalize_shapes, _compute_launch_config
+except ImportError:  # cupy is not installed
+    _compute_launch_config = None
+
+Shape = Tuple[int, ...]
+
+OUTER_SHAPES: List[Shape] = [
+    (),
+    (1,),
+    (2,),
+    (1, 1),
+    (1, 2),
+    (2, 1),
+    (3, 2),
+    (1, 3, 2),
+    (4, 3, 2),
+    (2, 1, 3, 2),
+    (5, 4, 3, 2),
+    (3, 1, 1),
+    (2, 3, 1),
+]
+
+ROWS: List[Tuple[int, int]] = [(1, 1), (3, 1), (1, 5), (3, 5)]
+
+
+def compatible(inputs_outer: Shape, cam_outer: Shape) -> bool:
+    shared_dims = min(len(inputs_outer), len(cam_outer))
+    return inputs_outer[len(inputs_outer) - shared_dims :] == (
+        cam_outer[len(cam_outer) - shared_dims :]
+    )
+
+
+def baseline_layout(
+    inputs_outer: Shape, cam_outer: Shape, input_rows: int, cam_rows: int
+) -> Tuple[np.ndarray, int, int, int]:
+    """
+    Replicates the original shape logic of `run_kernel` (without any canonicalization)
+    and returns the flat buffer index of every result together with the extended rows
+    and the amount of cores of the kernel launch.
+    """
+
+    sub_shape, super_shape = sorted([inputs_outer, cam_outer], key=len)
+
+    def overhang(shape: Shape) -> Shape:
+        return shape[: -len(sub_shape)] if sub_shape else shape
+
+    results_shape = super_shape + (input_rows, cam_rows)
+    results = np.arange(prod(results_shape)).reshape(results_shape)
+
+    match_dims = len(results_shape)
+    sub_shape_dims = len(sub_shape)
+
+    if len(inputs_outer) > len(cam_outer):
+        results = results.reshape(
+            (*sub_shape, *overhang(super_shape), input_rows, cam_rows)
+        ).transpose(
+            *range(sub_shape_dims, match_dims - 2),
+            *range(sub_shape_dims),
+            match_dims - 2,
+            match_dims - 1,
+        )
+    elif len(inputs_outer) < len(cam_outer):
+        results = results.reshape(
+            (*sub_shape, input_rows, *overhang(super_shape), cam_rows)
+        ).transpose(
+            *range(sub_shape_dims + 1, match_dims - 1),
+            *range(sub_shape_dims),
+            sub_shape_dims,
+            match_dims - 1,
+        )
+
+    return (
+        results,
+        input_rows * prod(overhang(inputs_outer)),
+        cam_rows * prod(overhang(cam_outer)),
+        prod(sub_shape),
+    )
+
+
+def config_layout(config) -> np.ndarray:
+    """Returns the flat buffer index of every result as laid out by `config`."""
+
+    size = prod(config.results_shape)
+    itemsize = np.dtype(np.int64).itemsize
+    buffer = np.arange(size, dtype=np.int64)
+    canonical = np.lib.stride_tricks.as_strided(
+        buffer,
+        shape=config.canonical_results_shape,
+        strides=[stride * itemsize for stride in config.canonical_results_strides],
+    )
+    return canonical.reshape(config.results_shape)
+
+
+@unittest.skipIf(_compute_launch_config is None, "cupy is not installed")
+class TestCanonicalizeShapes(unittest.TestCase):
+    def test_examples(self):
+        self.assertEqual(_canonicalize_shapes((1, 2, 4), (2, 4)), ((8,), (8,)))
+        self.assertEqual(_canonicalize_shapes((5, 3, 1, 2), (1, 2)), ((15, 2), (2,)))
+        self.assertEqual(_canonicalize_shapes((), ()), ((), ()))
+        self.assertEqual(_canonicalize_shapes((1, 1), (1,)), ((), ()))
+        self.assertEqual(_canonicalize_shapes((2,), (3, 2)), ((2,), (3, 2)))
+
+    def test_preserves_launch_size(self):
+        for inputs_outer, cam_outer in itertools.product(OUTER_SHAPES, repeat=2):
+            if not compatible(inputs_outer, cam_outer):
+                continue
+            canonical_inputs, canonical_cam = _canonicalize_shapes(
+                inputs_outer, cam_outer
+            )
+            self.assertEqual(prod(canonical_inputs), prod(inputs_outer))
+            self.assertEqual(prod(canonical_cam), prod(cam_outer))
+
+
+@unittest.skipIf(_compute_launch_config is None, "cupy is not installed")
+class TestComputeLaunchConfig(unittest.TestCase):
+    def test_matches_baseline_layout(self):
+        block_size = 64
+        pairs = itertools.product(OUTER_SHAPES, OUTER_SHAPES, ROWS, (1, 2))
+
+        for inputs_outer, cam_outer, (input_rows, cam_rows), width in pairs:
+            if not compatible(inputs_outer, cam_outer):
+                continue
+
+            with self.subTest(
+                inputs=inputs_outer, cam=cam_outer, rows=(input_rows, cam_rows)
+            ):
+                config = _compute_launch_config(
+                    inputs_outer + (input_rows, 4),
+                    cam_outer + (cam_rows, 4 * width),
+                    width,
+                    block_size,
+                    False,
+                )
+                expected, input_extent, cam_extent, cores = baseline_layout(
+                    inputs_outer, cam_outer, input_rows, cam_rows
+                )
+
+                self.assertEqual(config.columns, 4)
+                self.assertEqual(config.results_shape, expected.shape)
+                self.assertEqual(config.extended_input_rows, input_extent)
+                self.assertEqual(config.extended_cam_rows, cam_extent)
+                self.assertEqual(config.dim_grid[1], cores)
+
+                threads = config.dim_grid[0] * config.dim_block[0]
+                self.assertGreaterEqual(threads, input_extent * cam_extent)
+                self.assertLessEqual(config.dim_block[0], block_size)
+                self.assertEqual(config.dim_block[0] % 32, 0)
+
+                np.testing.assert_array_equal(config_layout(config), expected)
+
+    def test_reduction(self):
+        config = _compute_launch_config((3, 4), (5, 4), 1, 64, True)
+        self.assertEqual(config.results_shape, (3,))
+        self.assertEqual(config.extended_input_rows, 3)
+        self.assertEqual(config.extended_cam_rows, 5)
+        self.assertTrue(config.is_symmetric)
+        np.testing.assert_array_equal(config_layout(config), np.arange(3))
+
+    def test_empty(self):
+        config = _compute_launch_config((0, 3, 4), (3, 4), 1, 64, False)
+        self.assertEqual(config.results_shape, (0, 3, 3))
+        self.assertEqual(config.dim_grid, (0, 0, 0))
+        self.assertEqual(config.dim_block, (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,4 +14,46 @@
 # limitations under the License.
 ###
 
+import os
+from unittest import TestCase, mock
+
+from mlflow.exceptions import MlflowException
+from mlflow.protos.databricks_pb2 import RESOURCE_ALREADY_EXISTS
+
 from xtime.contrib.mlflow_ext import MLflow
+
+
+class TestMLflow(TestCase):
+    """python -m unittest tests.contrib.test_mlflow_ext.TestMLflow"""
+
+    @mock.patch.dict(os.environ, {"MLFLOW_EXPERIMENT_NAME": "xtime-test"})
+    @mock.patch("xtime.contrib.mlflow_ext.mlflow.create_experiment")
+    def test_create_experiment(self, create_experiment: mock.MagicMock) -> None:
+        """python -m unittest tests.contrib.test_mlflow_ext.TestMLflow.test_create_experiment"""
+        client = mock.MagicMock()
+        client.get_experiment_by_name.return_value = None
+        MLflow.create_experiment(client)
+        create_experiment.assert_called_once_with("xtime-test")
+
+        # Experiment already exists.
+        create_experiment.reset_mock()
+        client.get_experiment_by_name.return_value = mock.MagicMock()
+        MLflow.create_experiment(client)
+        create_experiment.assert_not_called()
+
+    @mock.patch.dict(os.environ, {"MLFLOW_EXPERIMENT_NAME": "xtime-test"})
+    @mock.patch("xtime.contrib.mlflow_ext.mlflow.create_experiment")
+    def test_create_experiment_concurrently(self, create_experiment: mock.MagicMock) -> None:
+        """python -m unittest tests.contrib.test_mlflow_ext.TestMLflow.test_create_experiment_concurrently"""
+        create_experiment.side_effect = MlflowException("already exists", error_code=RESOURCE_ALREADY_EXISTS)
+
+        # Another process created the experiment right after this one checked that it does not exist.
+        client = mock.MagicMock()
+        client.get_experiment_by_name.side_effect = [None, mock.MagicMock()]
+        MLflow.create_experiment(client)
+        create_experiment.assert_called_once_with("xtime-test")
+
+        # The experiment still does not exist, so this is a genuine error.
+        client.get_experiment_by_name.side_effect = [None, None]
+        with self.assertRaises(MlflowException):
+            MLflow.create_experiment(client)
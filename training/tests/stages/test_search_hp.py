@@ -14,6 +14,8 @@
 # limitations under the License.
 ###
 
+from unittest import TestCase, mock
+
 from xtime.stages.search_hp import (
     _get_metrics_for_best_trial,
     _init_search_algorithm,
@@ -23,3 +25,24 @@ from xtime.stages.search_hp import (
     _set_tags,
     search_hp,
 )
+
+
+class TestSearchHP(TestCase):
+    """python -m unittest tests.stages.test_search_hp.TestSearchHP"""
+
+    def test_description(self) -> None:
+        """python -m unittest tests.stages.test_search_hp.TestSearchHP.test_description"""
+
+        class _StopRun(Exception):
+            pass
+
+        for description, argv in (("xtime experiment search_hp", ["-m", "xtime.main"]), (None, ["xtime", "--help"])):
+            with mock.patch("xtime.stages.search_hp.ray"), mock.patch(
+                "xtime.stages.search_hp.MLflow.create_experiment"
+            ), mock.patch("xtime.stages.search_hp.sys.argv", argv), mock.patch(
+                "xtime.stages.search_hp.mlflow.start_run", side_effect=_StopRun
+            ) as start_run:
+                with self.assertRaises(_StopRun):
+                    search_hp("churn_modelling:default", "dummy", "random", None, 1, description=description)
+            # Without an explicit description, the run is described by the command line of this process.
+            start_run.assert_called_once_with(description=description or " ".join(argv))
@@ -14,9 +14,13 @@
 # limitations under the License.
 ###
 
+import json
 import logging
+import os
+import subprocess
+import sys
 import typing as t
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import pytest
 from click import BaseCommand
@@ -25,6 +29,7 @@ from click.testing import CliRunner, Result
 from xtime.datasets import DatasetBuilder, get_dataset_builder_registry
 from xtime.errors import ErrorCode
 from xtime.main import (
+    _get_search_hp_concurrency,
     _run_search_hp_pipeline,
     cli,
     dataset_describe,
@@ -37,6 +42,7 @@ from xtime.main import (
     experiments,
     hparams,
     hparams_query,
+    internal_search_hp,
     model_list,
     models,
 )
@@ -119,3 +125,100 @@ class TestMain(TestCase):
 
         available_models: t.List[str] = sorted((line[2:] for line in output_lines[1:] if line.startswith("- ")))
         self.assertListEqual(available_models, ["catboost", "dummy", "lightgbm", "rf", "xgboost"])
+
+    def test_help_lists_models(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_help_lists_models"""
+        for cli_func in (experiment_train, experiment_search_hp):
+            result: Result = CliRunner().invoke(cli_func, ["--help"])
+            self.assertEqual(result.exit_code, 0)
+            self.assertNotIn("{models}", result.output)
+            for model in ("catboost", "dummy", "lightgbm", "rf", "xgboost"):
+                self.assertIn(f"'{model}'", result.output)
+
+    def test_import_does_not_import_ray(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_import_does_not_import_ray"""
+        # This needs a fresh interpreter since other tests have imported ray already.
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, xtime.main; print('ray' in sys.modules)"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_internal_search_hp(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_internal_search_hp"""
+        self.assertIsInstance(internal_search_hp, BaseCommand)
+        pipeline_args = {
+            "dataset": "churn_modelling:default",
+            "model": "dummy",
+            "algorithm": "random",
+            "num_search_trials": 2,
+            "num_validate_trials": 0,
+            "gpu": False,
+        }
+        for hparams_ in (["params:n_estimators=10", "params:lr=0.01"], None):
+            with mock.patch("xtime.main._run_search_hp_pipeline") as pipeline:
+                args = dict(pipeline_args, hparams=hparams_)
+                result: Result = CliRunner().invoke(internal_search_hp, [json.dumps(args)])
+                self.assertEqual(result.exit_code, 0, result.output)
+                pipeline.assert_called_once_with(
+                    **dict(args, hparams=tuple(hparams_) if hparams_ is not None else None)
+                )
+                if hparams_ is not None:
+                    self.assertIsInstance(pipeline.call_args.kwargs["hparams"], tuple)
+
+    def test_search_hp_creates_experiment_once(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_search_hp_creates_experiment_once"""
+        calls = mock.MagicMock()
+        with mock.patch("xtime.contrib.mlflow_ext.MLflow.create_experiment", calls.create_experiment), mock.patch(
+            "xtime.main._run_search_hp_subprocess", calls.run_search_hp_subprocess
+        ):
+            result: Result = CliRunner().invoke(
+                experiment_search_hp,
+                ["churn_modelling:default,eye_movements:default", "dummy", "random", "--num-search-trials", "1"],
+            )
+        self.assertEqual(result.exit_code, 0, result.output)
+        # The experiment is created before any of the pipelines are started.
+        self.assertEqual(calls.mock_calls[0], mock.call.create_experiment())
+        self.assertEqual(calls.create_experiment.call_count, 1)
+        self.assertEqual(calls.run_search_hp_subprocess.call_count, 2)
+
+    def test_search_hp_description(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_search_hp_description"""
+        argv = ["xtime", "experiment", "search_hp", "churn_modelling:default", "dummy", "random"]
+        with mock.patch("xtime.contrib.mlflow_ext.MLflow.create_experiment"), mock.patch.object(
+            sys, "argv", argv
+        ), mock.patch("xtime.main.subprocess.run") as run:
+            result: Result = CliRunner().invoke(experiment_search_hp, argv[3:])
+        self.assertEqual(result.exit_code, 0, result.output)
+        run.assert_called_once()
+        # The subprocess runs the internal command, but MLflow runs are described by the original command line.
+        pipeline_args: t.Dict = json.loads(run.call_args.args[0][-1])
+        self.assertEqual(pipeline_args["description"], " ".join(argv))
+
+        with mock.patch("xtime.stages.search_hp.search_hp", return_value="mlflow:///123") as search_hp:
+            result = CliRunner().invoke(internal_search_hp, [json.dumps(pipeline_args)])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(search_hp.call_args.args[-1], " ".join(argv))
+
+    def test_get_search_hp_concurrency(self) -> None:
+        """python -m unittest tests.test_cli.TestMain.test_get_search_hp_concurrency"""
+        with mock.patch.dict(os.environ, {"CUDA_VISIBLE_DEVICES": "0, 1"}):
+            max_workers, devices = _get_search_hp_concurrency(3, 4, gpu=True)
+            self.assertEqual(max_workers, 2)
+            self.assertListEqual(sorted(devices.get_nowait() for _ in range(devices.qsize())), ["0", "1"])
+
+            max_workers, devices = _get_search_hp_concurrency(1, 4, gpu=True)
+            self.assertEqual(max_workers, 1)
+            self.assertIsNotNone(devices)
+
+        with mock.patch.dict(os.environ, clear=False):
+            os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+            self.assertEqual(_get_search_hp_concurrency(3, 4, gpu=True), (1, None))
+
+            with mock.patch("os.cpu_count", return_value=8):
+                self.assertEqual(_get_search_hp_concurrency(3, 4, gpu=False), (2, None))
+                self.assertEqual(_get_search_hp_concurrency(3, 1, gpu=False), (3, None))
+                self.assertEqual(_get_search_hp_concurrency(3, 16, gpu=False), (1, None))
@@ -21,6 +21,7 @@ from pathlib import Path
 import mlflow
 from mlflow import MlflowClient
 from mlflow.entities import Experiment, Run
+from mlflow.exceptions import MlflowException
 from mlflow.store.entities import PagedList
 from mlflow.utils.file_utils import local_file_uri_to_path
 
@@ -115,6 +116,9 @@ class MLflow(object):
     def create_experiment(client: t.Optional[MlflowClient] = None) -> None:
         """Create a new MLflow experiment with name specified in `MLFLOW_EXPERIMENT_NAME` environment variable.
 
+        It is not an error if the experiment is created concurrently by another process (e.g., when multiple
+        pipelines start at the same time) between checking whether it exists and creating it.
+
         Args:
             client: MLflow client to use. If not provided, a default client will be used.
         """
@@ -125,7 +129,11 @@ class MLflow(object):
 
         name = os.environ.get(_EXPERIMENT_NAME_ENV_VAR, None)
         if name and client.get_experiment_by_name(name) is None:
-            mlflow.create_experiment(name)
+            try:
+                mlflow.create_experiment(name)
+            except MlflowException:
+                if client.get_experiment_by_name(name) is None:
+                    raise
 
     @staticmethod
     def get_tags_from_env() -> t.Dict:
@@ -16,23 +16,20 @@
 
 import json
 import logging
+import os
+import queue
+import subprocess
 import sys
 import typing as t
-from multiprocessing import Process
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import click
 import coloredlogs
-from ray import tune
-
-from xtime.datasets import (
-    Dataset,
-    DatasetBuilder,
-    build_dataset,
-    get_dataset_builder_registry,
-    get_known_unknown_datasets,
-)
+
 from xtime.errors import XTimeError
-from xtime.estimators import get_estimator_registry
+
+if t.TYPE_CHECKING:
+    from xtime.datasets import Dataset, DatasetBuilder
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +43,27 @@ dataset_arg_help = (
 
 
 model_arg = click.argument("model", type=str, metavar="MODEL")
-model_arg_help = f"Available ML models are: {list(get_estimator_registry().keys())}."
+model_arg_help = "Available ML models are: {models}."
+
+
+class LazyHelpCommand(click.Command):
+    """Click command that fills in available ML models in its help text only when this help text is requested.
+
+    Listing models requires the estimator registry, which is not needed (and should not be imported) by commands that
+    are run without `--help`.
+    """
+
+    @property
+    def help(self) -> t.Optional[str]:
+        if self._help is None or "{models}" not in self._help:
+            return self._help
+        from xtime.estimators import get_estimator_registry
+
+        return self._help.replace("{models}", str(list(get_estimator_registry().keys())))
+
+    @help.setter
+    def help(self, help: t.Optional[str]) -> None:
+        self._help = help
 
 
 params_option = click.option(
@@ -82,17 +99,74 @@ def _run_search_hp_pipeline(
     num_search_trials: int,
     num_validate_trials: int = 0,
     gpu: bool = False,
+    description: t.Optional[str] = None,
 ) -> None:
+    """Run an ML pipeline that includes (1) hyperparameter search and (2) analysis how stable hyperparameters are.
+
+    The `description` of MLflow runs defaults to the command line of this process, so it needs to be provided when
+    this pipeline runs on behalf of another process.
+    """
+    from ray import tune
+
     from xtime.stages.search_hp import search_hp
 
-    """Run an ML pipeline that includes (1) hyperparameter search and (2) analysis how stable hyperparameters are."""
-    mlflow_uri: str = search_hp(dataset, model, algorithm, hparams, num_search_trials, gpu)
+    mlflow_uri: str = search_hp(dataset, model, algorithm, hparams, num_search_trials, gpu, description)
     if num_validate_trials > 0:
         validate_hparams = [
             mlflow_uri,  # Take the best hyperparameters from this MLFlow run.
             {"random_state": tune.randint(0, int(2**32 - 1))},  # And vary random seed to validate these HPs are stable.
         ]
-        search_hp(dataset, model, "random", validate_hparams, num_validate_trials, gpu)
+        search_hp(dataset, model, "random", validate_hparams, num_validate_trials, gpu, description)
+
+
+def _get_visible_gpus() -> t.List[str]:
+    """Return identifiers of GPUs listed in the `CUDA_VISIBLE_DEVICES` environment variable."""
+    devices: str = os.environ.get("CUDA_VISIBLE_DEVICES", "")
+    return [device.strip() for device in devices.split(",") if device.strip()]
+
+
+def _get_search_hp_concurrency(
+    num_problems: int, num_search_trials: int, gpu: bool
+) -> t.Tuple[int, t.Optional[queue.Queue]]:
+    """Return how many search_hp pipelines for different datasets to run in parallel, and optional queue of GPUs.
+
+    With GPUs, every pipeline gets its own GPU taken from the returned queue, so that pipelines for different datasets
+    do not compete for the same device. If GPUs are requested but `CUDA_VISIBLE_DEVICES` does not list them, pipelines
+    are run one at a time since they can not be pinned to different devices. Without GPUs, the number of parallel
+    pipelines is chosen such that all their parallel trials fit available CPUs.
+    """
+    if gpu:
+        gpus: t.List[str] = _get_visible_gpus()
+        if not gpus:
+            return 1, None
+        devices = queue.Queue()
+        for device in gpus:
+            devices.put(device)
+        return min(num_problems, len(gpus)), devices
+    return max(1, min(num_problems, (os.cpu_count() or 1) // max(1, num_search_trials))), None
+
+
+def _run_search_hp_subprocess(pipeline_args: t.Dict, devices: t.Optional[queue.Queue] = None) -> None:
+    """Run `_run_search_hp_pipeline` in a fresh Python interpreter via the hidden `_internal_search_hp` command.
+
+    Unlike a forked process, a fresh interpreter does not inherit any CUDA state from this process, and all GPU memory
+    it allocates is guaranteed to be released when it exits. If `devices` is provided, the subprocess is pinned to one
+    GPU taken from this queue while it runs.
+    """
+    env: t.Dict[str, str] = os.environ.copy()
+    device: t.Optional[str] = devices.get() if devices is not None else None
+    try:
+        if device is not None:
+            env["CUDA_VISIBLE_DEVICES"] = device
+        cmd: t.List[str] = [sys.executable, "-m", "xtime.main"]
+        log_level: str = logging.getLevelName(logger.root.getEffectiveLevel()).lower()
+        if log_level in ("critical", "error", "warning", "info", "debug"):
+            cmd.extend(["--log-level", log_level])
+        cmd.extend(["_internal_search_hp", json.dumps(pipeline_args)])
+        subprocess.run(cmd, check=True, env=env)
+    finally:
+        if device is not None:
+            devices.put(device)
 
 
 @click.group(name="xtime", help="Machine Learning benchmarks for tabular data for XTIME project.")
@@ -125,7 +199,9 @@ def experiments() -> None: ...
 
 
 @experiments.command(
-    name="train", help=f"Train a MODEL ML model on a DATASET dataset. {dataset_arg_help} {model_arg_help}"
+    name="train",
+    cls=LazyHelpCommand,
+    help=f"Train a MODEL ML model on a DATASET dataset. {dataset_arg_help} {model_arg_help}",
 )
 @dataset_arg
 @model_arg
@@ -143,6 +219,7 @@ def experiment_train(dataset: str, model: str, params: t.Tuple[str]) -> None:
 
 @experiments.command(
     name="search_hp",
+    cls=LazyHelpCommand,
     help="Optimize a MODEL ML model on a DATASET dataset - run hyperparameter optimization experiment. "
     f"{dataset_arg_help} {model_arg_help} Available algorithms are `random` and `hyperopt`.",
 )
@@ -178,21 +255,59 @@ def experiment_search_hp(
     # will enable the search_hp function to retrieve default parameters in this case.
     params = params if len(params) > 0 else None
     try:
+        from xtime.contrib.mlflow_ext import MLflow
+        from xtime.datasets import get_dataset_builder_registry, get_known_unknown_datasets
+
         known_problems, unknown_problems = get_known_unknown_datasets(dataset.split(sep=","))
         if unknown_problems:
             print(f"Unknown datasets: {unknown_problems}.")
             print(f"Use one of these: {get_dataset_builder_registry().keys()}.")
             exit(1)
-        for _problem in known_problems:
-            try:
-                process = Process(
-                    target=_run_search_hp_pipeline,
-                    args=(_problem, model, algorithm, params, num_search_trials, num_validate_trials, gpu),
+        # Pipelines running concurrently would otherwise race to create the same MLflow experiment.
+        MLflow.create_experiment()
+        max_workers, devices = _get_search_hp_concurrency(len(known_problems), num_search_trials, gpu)
+        # Threads are sufficient here since every pipeline runs in its own subprocess.
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures: t.Dict[str, Future] = {
+                _problem: executor.submit(
+                    _run_search_hp_subprocess,
+                    {
+                        "dataset": _problem,
+                        "model": model,
+                        "algorithm": algorithm,
+                        "hparams": params,
+                        "num_search_trials": num_search_trials,
+                        "num_validate_trials": num_validate_trials,
+                        "gpu": gpu,
+                        # Subprocesses run the internal command, so MLflow runs are described by this command line.
+                        "description": " ".join(sys.argv),
+                    },
+                    devices,
                 )
-                process.start()
-                process.join()
-            except Exception as err:
-                print(f"Error executing the `optimize` task for {dataset}. Error = {err}.")
+                for _problem in known_problems
+            }
+            for _problem, future in futures.items():
+                try:
+                    future.result()
+                except Exception as err:
+                    print(f"Error executing the `optimize` task for {_problem}. Error = {err}.")
+    except Exception as err:
+        print_err_and_exit(err)
+
+
+@cli.command(
+    name="_internal_search_hp",
+    hidden=True,
+    help="Run a search_hp pipeline with JSON-encoded PIPELINE_ARGS (used by `experiment search_hp` internally).",
+)
+@click.argument("pipeline_args", type=str, metavar="PIPELINE_ARGS")
+def internal_search_hp(pipeline_args: str) -> None:
+    try:
+        kwargs: t.Dict = json.loads(pipeline_args)
+        # JSON does not preserve tuples.
+        if kwargs["hparams"] is not None:
+            kwargs["hparams"] = tuple(kwargs["hparams"])
+        _run_search_hp_pipeline(**kwargs)
     except Exception as err:
         print_err_and_exit(err)
 
@@ -241,7 +356,9 @@ def datasets() -> None: ...
 @dataset_arg
 def dataset_describe(dataset: str) -> None:
     try:
-        ds: Dataset = build_dataset(dataset).validate()
+        from xtime.datasets import build_dataset
+
+        ds: "Dataset" = build_dataset(dataset).validate()
         json.dump(ds.summary(), sys.stdout, indent=4)
     except Exception as err:
         print_err_and_exit(err)
@@ -260,7 +377,9 @@ def dataset_describe(dataset: str) -> None:
 )
 def dataset_save(dataset: str, directory: t.Optional[str] = None) -> None:
     try:
-        ds: Dataset = build_dataset(dataset).validate()
+        from xtime.datasets import build_dataset
+
+        ds: "Dataset" = build_dataset(dataset).validate()
         ds.save(directory)
     except Exception as err:
         print_err_and_exit(err)
@@ -271,9 +390,11 @@ def dataset_list() -> None:
     from prettytable import PrettyTable
 
     try:
+        from xtime.datasets import get_dataset_builder_registry
+
         table = PrettyTable(field_names=["Dataset", "Versions"])
         for name in get_dataset_builder_registry().keys():
-            dataset_builder: DatasetBuilder = get_dataset_builder_registry().get(name)()
+            dataset_builder: "DatasetBuilder" = get_dataset_builder_registry().get(name)()
             table.add_row([name, ", ".join(dataset_builder.builders.keys())])
         print("Available datasets:")
         print(table)
@@ -292,6 +413,8 @@ def models() -> None: ...
 @models.command("list", help="List all available models.")
 def model_list() -> None:
     try:
+        from xtime.estimators import get_estimator_registry
+
         print("Available models:")
         for name in get_estimator_registry().keys():
             print(f"- {name}")
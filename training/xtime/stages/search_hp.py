@@ -45,14 +45,24 @@ logger = logging.getLogger(__name__)
 
 
 def search_hp(
-    dataset: str, model: str, algorithm: str, hparams: t.Optional[HParamsSource], num_trials: int, gpu: bool = False
+    dataset: str,
+    model: str,
+    algorithm: str,
+    hparams: t.Optional[HParamsSource],
+    num_trials: int,
+    gpu: bool = False,
+    description: t.Optional[str] = None,
 ) -> str:
     estimator: t.Type[Estimator] = get_estimator(model)
 
+    # By default, the MLflow run is described by the command line of this process.
+    if description is None:
+        description = " ".join(sys.argv)
+
     ray.init()
     ray_tune_extensions.add_representers()
     MLflow.create_experiment()
-    with mlflow.start_run(description=" ".join(sys.argv)) as active_run:
+    with mlflow.start_run(description=description) as active_run:
         # This MLflow run tracks Ray Tune hyperparameter search. Individual trials won't have their own MLflow runs.
         MLflow.init_run(active_run)
         IO.save_yaml(